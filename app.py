@@ -1,22 +1,355 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, redirect, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 import json
 import re
-from PIL import Image, ExifTags
+import hashlib
+import tempfile
+import base64
+import io
+import time
+import secrets
+import threading
+import gzip
+import bisect
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ExifTags, features
+from storage import LocalStorage, create_storage
+from admission import AdmissionController
+from records import ImageRecord
+from profiling import init_profiling
+from serialization import dumps, loads, join_array, accepts_encoding, choose_encoding, compress, MIN_COMPRESS_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows, only threads of one process are serialized
+    fcntl = None
 
 app = Flask(__name__)
 
 # Configure upload folder
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-app.config['METADATA_FILE'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metadata.json')
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+app.config['METADATA_FILE'] = os.environ.get('METADATA_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metadata.json')
+
+# Blob storage backend for image bytes: 'local' (UPLOAD_FOLDER) or 's3'
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX', '')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL')
+app.config['S3_REGION'] = os.environ.get('S3_REGION')
+app.config['S3_MAX_POOL_CONNECTIONS'] = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 20))
+app.config['S3_MULTIPART_THRESHOLD'] = int(os.environ.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+app.config['S3_URL_EXPIRES'] = int(os.environ.get('S3_URL_EXPIRES', 3600))
+
+# Staged uploads from /extract_metadata, committed by /upload with a token
+app.config['STAGING_TTL'] = int(os.environ.get('STAGING_TTL', 3600))
+app.config['STAGING_GC_INTERVAL'] = int(os.environ.get('STAGING_GC_INTERVAL', 300))
+
+# Change feed: tombstones of deleted records kept for incremental sync
+app.config['CHANGES_FILE'] = os.environ.get('CHANGES_FILE')
+app.config['CHANGES_MAX_TOMBSTONES'] = int(os.environ.get('CHANGES_MAX_TOMBSTONES', 10000))
+app.config['CHANGES_PAGE_SIZE'] = int(os.environ.get('CHANGES_PAGE_SIZE', 1000))
+app.config['CHANGES_POLL_INTERVAL'] = float(os.environ.get('CHANGES_POLL_INTERVAL', 1))
+app.config['CHANGES_STREAM_TIMEOUT'] = int(os.environ.get('CHANGES_STREAM_TIMEOUT', 300))
+# Open streams allowed per worker process; keep well below gunicorn's --threads
+app.config['CHANGES_MAX_STREAMS'] = int(os.environ.get('CHANGES_MAX_STREAMS', 2))
+app.config['CHANGES_RETRY_AFTER'] = int(os.environ.get('CHANGES_RETRY_AFTER', 15))
+
+# Bump whenever extract_ai_metadata or parse_metadata_string output improves,
+# so the background re-extraction picks up records made by older versions.
+# Records saved before versions were stamped count as version 0.
+EXTRACTOR_VERSION = 1
+
+# Background re-extraction of records stamped with an older extractor version
+app.config['REEXTRACT_STATUS_FILE'] = os.environ.get('REEXTRACT_STATUS_FILE')
+app.config['REEXTRACT_WORKERS'] = int(os.environ.get('REEXTRACT_WORKERS', 2))
+app.config['REEXTRACT_RATE'] = float(os.environ.get('REEXTRACT_RATE', 5))
+app.config['REEXTRACT_BATCH_SIZE'] = int(os.environ.get('REEXTRACT_BATCH_SIZE', 50))
+
+# Opt-in sampled request profiling, written as collapsed stacks for flamegraphs
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+app.config['PROFILE_INTERVAL'] = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+app.config['PROFILE_MAX_FILES'] = int(os.environ.get('PROFILE_MAX_FILES', 200))
+
+# Threads per gunicorn worker, the Procfile passes the same value to --threads
+app.config['WORKER_THREADS'] = int(os.environ.get('WORKER_THREADS', 8))
+app.config['MIN_FREE_THREADS'] = int(os.environ.get('MIN_FREE_THREADS', 2))
+
+# Admission control for CPU-heavy metadata extraction, per worker process
+app.config['EXTRACTION_CONCURRENCY'] = int(os.environ.get('EXTRACTION_CONCURRENCY', 2))
+app.config['EXTRACTION_QUEUE_SIZE'] = int(os.environ.get('EXTRACTION_QUEUE_SIZE', 2))
+app.config['EXTRACTION_QUEUE_TIMEOUT'] = float(os.environ.get('EXTRACTION_QUEUE_TIMEOUT', 10))
+app.config['EXTRACTION_RETRY_AFTER'] = int(os.environ.get('EXTRACTION_RETRY_AFTER', 5))
+
+extraction_admission = AdmissionController(
+    app.config['EXTRACTION_CONCURRENCY'],
+    app.config['EXTRACTION_QUEUE_SIZE'],
+    app.config['EXTRACTION_QUEUE_TIMEOUT'],
+)
+
+# Each change stream pins a worker thread for its whole lifetime
+change_stream_slots = threading.BoundedSemaphore(app.config['CHANGES_MAX_STREAMS']) if app.config['CHANGES_MAX_STREAMS'] > 0 else None
 
-# Create upload folder if it doesn't exist
+# Extractions, queued uploads and change streams all hold a thread, gallery reads need the rest
+_reserved_threads = (app.config['EXTRACTION_CONCURRENCY'] + app.config['EXTRACTION_QUEUE_SIZE']
+                     + max(app.config['CHANGES_MAX_STREAMS'], 0))
+if _reserved_threads > app.config['WORKER_THREADS'] - app.config['MIN_FREE_THREADS']:
+    print(f"Warning: extraction slots, extraction queue and change streams can hold {_reserved_threads} "
+          f"of {app.config['WORKER_THREADS']} worker threads, leaving fewer than "
+          f"{app.config['MIN_FREE_THREADS']} for gallery reads")
+
+# Create upload folder if it doesn't exist (also used as local scratch space)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-def extract_ai_metadata(image_path):
-    """Extract metadata from AI-generated images"""
+def get_storage():
+    """Return the configured blob storage backend, created on first use"""
+    if 'blob_storage' not in app.extensions:
+        app.extensions['blob_storage'] = create_storage(app.config)
+    return app.extensions['blob_storage']
+
+def sharded_storage_path(digest, filename):
+    """Build the content-addressed path (ab/cd/<hash>.<ext>) for an upload"""
+    # The name comes from the client, only keep a short alphanumeric extension
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,8}', ext):
+        ext = ''
+    return '/'.join([digest[:2], digest[2:4], f"{digest}{ext}"])
+
+def spool_upload(file_storage):
+    """Stream an uploaded file to a local scratch file, returning (temp_path, sha256 hex digest)"""
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(prefix='.incoming_', dir=app.config['UPLOAD_FOLDER'])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+def store_upload(temp_path, digest, filename):
+    """Put a spooled upload into blob storage under its sharded path and return that path"""
+    storage = get_storage()
+    storage_path = sharded_storage_path(digest, filename)
+    # Identical content already stored, keep the existing copy
+    if not storage.head(storage_path):
+        storage.put_file(storage_path, temp_path)
+    return storage_path
+
+def resolve_upload_path(filename, metadata=None):
+    """Map a public upload filename to its blob storage key"""
+    if metadata is None:
+        metadata = load_records()
+    item = metadata.get(filename)
+    if item and item.get('storage_path'):
+        return item.get('storage_path')
+    # Legacy flat layout, not migrated yet
+    return filename
+
+def split_raw_chunks(metadata):
+    """Separate the raw text_<key> chunks from the summary fields of extracted metadata"""
+    summary = {k: v for k, v in metadata.items() if not k.startswith('text_')}
+    raw = {k[len('text_'):]: v for k, v in metadata.items() if k.startswith('text_')}
+    return summary, raw
+
+def raw_chunks_key(storage_path):
+    """Blob storage key of the compressed raw chunks for an image"""
+    return f"raw/{storage_path}.json.gz"
+
+def store_raw_chunks(storage_path, raw):
+    """Gzip the raw text chunks (prompt/workflow JSON etc.) into blob storage, returning the key"""
+    if not raw:
+        return None
+    key = raw_chunks_key(storage_path)
+    storage = get_storage()
+    if not storage.head(key):
+        data = gzip.compress(json.dumps(raw).encode('utf-8'))
+        storage.put(key, io.BytesIO(data), content_type='application/gzip')
+    return key
+
+STAGING_PREFIX = 'staging/'
+
+def staged_upload_key(token):
+    """Blob storage key of the staging record for a token, or None if the token is malformed"""
+    if not token or not re.fullmatch(r'[A-Za-z0-9_-]{16,64}', token):
+        return None
+    return f"{STAGING_PREFIX}{token}.json"
+
+def stage_upload(file_storage):
+    """
+    Store an image and its extracted metadata under a short-lived token.
+
+    The blob goes straight to its final content-addressed key, so committing
+    the token later only has to write the metadata record. The staging
+    record itself lives in blob storage too, so any host behind the load
+    balancer can commit or expire it.
+    """
+    temp_path, digest = spool_upload(file_storage)
+    token = secrets.token_urlsafe(24)
+    try:
+        img_metadata, raw = split_raw_chunks(extract_ai_metadata(temp_path))
+        storage_path = sharded_storage_path(digest, file_storage.filename)
+        expires_at = time.time() + app.config['STAGING_TTL']
+        # Record the token before the dedup check, so the staging GC sees the blob as live
+        # before we decide to reuse it instead of uploading our own copy
+        with metadata_lock():
+            write_staged_upload(token, {
+                'storage_path': storage_path,
+                'raw_path': raw_chunks_key(storage_path) if raw else None,
+                'expires_at': expires_at,
+            })
+            stored = get_storage().head(storage_path)
+        if not stored:
+            get_storage().put_file(storage_path, temp_path)
+        staged = {
+            'digest': digest,
+            'storage_path': storage_path,
+            'raw_path': store_raw_chunks(storage_path, raw),
+            'original_filename': file_storage.filename,
+            'metadata': img_metadata,
+            'placeholder': compute_placeholder(temp_path),
+            'extractor_version': EXTRACTOR_VERSION,
+            'expires_at': expires_at,
+        }
+    finally:
+        os.remove(temp_path)
+
+    write_staged_upload(token, staged)
+    return token, staged
+
+def read_staged_upload(key):
+    """Read a staging record, returning None if it is missing or unreadable"""
+    storage = get_storage()
+    if not storage.head(key):
+        return None
+    try:
+        with storage.open(key) as f:
+            return json.loads(f.read())
+    except Exception as e:
+        print(f"Error loading staged upload {key}: {e}")
+        return None
+
+def load_staged_upload(token):
+    """Load a staged upload, returning None if the token is unknown, expired or already committed"""
+    key = staged_upload_key(token)
+    staged = read_staged_upload(key) if key else None
+    if not staged or staged.get('claimed_by') or staged.get('expires_at', 0) < time.time():
+        return None
+    return staged
+
+def write_staged_upload(token, staged):
+    get_storage().put(staged_upload_key(token), io.BytesIO(json.dumps(staged).encode('utf-8')),
+                      content_type='application/json')
+
+def claim_staged_upload(token, filename):
+    """
+    Mark a staged upload as committed to filename before its record is
+    saved, so a double submit can't commit it twice. Must be called under
+    metadata_lock(). Returns None if the token can't be committed.
+    """
+    staged = load_staged_upload(token)
+    if staged:
+        # Kept until expiry so a resubmit learns the filename; the blob stays referenced
+        write_staged_upload(token, {
+            'claimed_by': filename,
+            'storage_path': staged['storage_path'],
+            'expires_at': staged['expires_at'],
+        })
+    return staged
+
+def staged_upload_rejected(token):
+    """Error response for a token load_staged_upload() refused"""
+    key = staged_upload_key(token)
+    staged = (read_staged_upload(key) if key else None) or {}
+    if staged.get('claimed_by'):
+        return jsonify({'error': 'This upload was already saved', 'filename': staged['claimed_by']}), 409
+    return jsonify({'error': 'Upload token expired or unknown', 'upload_token_expired': True}), 400
+
+def scan_staged_uploads(keys, now, seen=None):
+    """Split staging records into expired ones and the blob paths still held by live ones"""
+    expired = {}
+    live_paths = set()
+    for key in keys:
+        if seen is not None and key in seen:
+            continue
+        staged = read_staged_upload(key) or {}
+        if staged.get('expires_at', 0) >= now:
+            live_paths.add(staged.get('storage_path'))
+        else:
+            expired[key] = staged
+    return expired, live_paths
+
+def collect_expired_staged_uploads():
+    """Delete expired staging records and any blobs no image record ended up using"""
+    storage = get_storage()
+    now = time.time()
+    keys = list(storage.list_keys(STAGING_PREFIX))
+    expired, live_paths = scan_staged_uploads(keys, now)
+    if not expired:
+        return 0
+
+    # stage_upload() writes its record and checks for an existing blob under the lock,
+    # so records listed here are everything that may still reuse a blob we delete
+    removed = 0
+    with metadata_lock():
+        _, new_live = scan_staged_uploads(storage.list_keys(STAGING_PREFIX), now, seen=set(keys))
+        live_paths |= new_live
+        referenced = {item.get('storage_path') for item in load_metadata().values()}
+        for key, staged in expired.items():
+            if not storage.head(key):
+                continue
+            try:
+                storage.delete(key)
+                removed += 1
+                storage_path = staged.get('storage_path')
+                if storage_path and storage_path not in referenced and storage_path not in live_paths:
+                    storage.delete(storage_path)
+                    if staged.get('raw_path'):
+                        storage.delete(staged['raw_path'])
+                    print(f"Deleted expired staged upload {storage_path}")
+            except Exception as e:
+                print(f"Error deleting staged upload {key}: {e}")
+    return removed
+
+_staging_gc_thread = None
+_staging_gc_thread_lock = threading.Lock()
+
+def run_staging_gc():
+    while True:
+        time.sleep(app.config['STAGING_GC_INTERVAL'])
+        try:
+            collect_expired_staged_uploads()
+        except Exception as e:
+            print(f"Error collecting staged uploads: {e}")
+
+def start_staging_gc():
+    """Start this worker's staging GC thread, once, off the request path"""
+    global _staging_gc_thread
+    with _staging_gc_thread_lock:
+        if _staging_gc_thread is None or not _staging_gc_thread.is_alive():
+            _staging_gc_thread = threading.Thread(target=run_staging_gc, daemon=True)
+            _staging_gc_thread.start()
+
+def extraction_overloaded():
+    """503 response telling the client to retry the extraction later"""
+    response = jsonify({'error': 'Server is busy processing uploads, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['EXTRACTION_RETRY_AFTER'])
+    return response
+
+def extract_ai_metadata(image_path, apply_defaults=True):
+    """
+    Extract metadata from AI-generated images. With apply_defaults=False
+    only the fields actually found are returned and errors are raised
+    instead of returning placeholder values.
+    """
     try:
         img = Image.open(image_path)
         metadata = {}
@@ -283,7 +616,7 @@ def extract_ai_metadata(image_path):
         }
         
         for key, default_value in defaults.items():
-            if not metadata.get(key):
+            if apply_defaults and not metadata.get(key):
                 metadata[key] = default_value
         
         # Preserve NSFW detection functionality
@@ -307,6 +640,8 @@ def extract_ai_metadata(image_path):
         print(f"Error extracting metadata: {e}")
         import traceback
         traceback.print_exc()
+        if not apply_defaults:
+            raise
         return {
             'prompt': 'Error extracting metadata',
             'negative_prompt': '',
@@ -587,7 +922,7 @@ def load_metadata():
         if os.path.exists(app.config['METADATA_FILE']):
             with open(app.config['METADATA_FILE'], 'r') as f:
                 try:
-                    data = json.load(f)
+                    data = loads(f.read())
                     if isinstance(data, list):
                         # Convert old list format to dictionary
                         return {item['filename']: item for item in data if 'filename' in item}
@@ -607,6 +942,165 @@ def load_metadata():
         print(f"Error loading metadata: {e}")
     return {}
 
+_metadata_thread_lock = threading.RLock()
+_metadata_lock_state = {'depth': 0, 'file': None}
+
+@contextmanager
+def metadata_lock():
+    """
+    Hold the metadata write lock around a load -> modify -> save cycle.
+
+    Threads of a worker wait on an in-process lock and worker processes on
+    an flock of metadata.json.lock, so concurrent writers never save over
+    each other's changes. Re-entrant within a thread.
+    """
+    with _metadata_thread_lock:
+        state = _metadata_lock_state
+        if state['depth'] == 0 and fcntl is not None:
+            state['file'] = open(f"{app.config['METADATA_FILE']}.lock", 'a')
+            fcntl.flock(state['file'], fcntl.LOCK_EX)
+        state['depth'] += 1
+        try:
+            yield
+        finally:
+            state['depth'] -= 1
+            if state['depth'] == 0 and state['file'] is not None:
+                fcntl.flock(state['file'], fcntl.LOCK_UN)
+                state['file'].close()
+                state['file'] = None
+
+def changes_file_path():
+    """Path of the tombstone file, next to the metadata file unless configured"""
+    return app.config['CHANGES_FILE'] or f"{os.path.splitext(app.config['METADATA_FILE'])[0]}_changes.json"
+
+def load_change_log():
+    """
+    Load the change log: {'deleted': {filename: change_seq}} tombstones of
+    deleted records and pruned_seq, the newest sequence whose tombstone
+    has been pruned.
+    """
+    try:
+        with open(changes_file_path(), 'r') as f:
+            data = json.load(f)
+        return {'deleted': data.get('deleted', {}), 'pruned_seq': data.get('pruned_seq', 0)}
+    except FileNotFoundError:
+        pass
+    except (OSError, json.JSONDecodeError, AttributeError) as e:
+        print(f"Error loading change tombstones: {e}")
+    return {'deleted': {}, 'pruned_seq': 0}
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return (path, None)
+
+_gallery_snapshot = {'stamp': None}
+_gallery_lock = threading.Lock()
+
+def load_gallery_snapshot():
+    """
+    Return the parsed gallery for read-only use: records as {filename:
+    ImageRecord}, (change_seq, filename) pairs sorted for the change feed,
+    tombstones and the current sequence. Rebuilt only when the metadata
+    or tombstone file changes on disk.
+    """
+    global _gallery_snapshot
+    stamp = (_file_stamp(app.config['METADATA_FILE']), _file_stamp(changes_file_path()))
+
+    with _gallery_lock:
+        if _gallery_snapshot['stamp'] != stamp:
+            # Unchanged records (same change_seq) keep their object
+            previous = _gallery_snapshot.get('records', {})
+            records = {}
+            for filename, item in load_metadata().items():
+                old = previous.get(filename)
+                if old is not None and item.get('change_seq') and old.get('change_seq') == item.get('change_seq'):
+                    records[filename] = old
+                else:
+                    records[filename] = ImageRecord.from_dict(item)
+            change_log = load_change_log()
+            tombstones = change_log['deleted']
+            by_seq = sorted(
+                (item.get('change_seq', 0), filename) for filename, item in records.items()
+            )
+            seq = max([by_seq[-1][0] if by_seq else 0, change_log['pruned_seq']] + list(tombstones.values()))
+            _gallery_snapshot = {
+                'stamp': stamp,
+                'records': records,
+                'by_seq': by_seq,
+                'tombstones': tombstones,
+                'pruned_seq': change_log['pruned_seq'],
+                'seq': seq,
+                # Serialized unfiltered listings, built on first request for this version
+                'bodies': {},
+            }
+        return _gallery_snapshot
+
+def load_records():
+    """Return {filename: ImageRecord} for read-only use"""
+    return load_gallery_snapshot()['records']
+
+def collect_changes(since, limit):
+    """Records added, updated and deleted after sequence number since"""
+    snapshot = load_gallery_snapshot()
+    by_seq = snapshot['by_seq']
+    changed = by_seq[bisect.bisect_right(by_seq, (since, chr(0x10FFFF))):]
+    deleted = sorted(
+        (seq, filename) for filename, seq in snapshot['tombstones'].items() if seq > since
+    )
+    events = sorted(changed + [(seq, filename, 'deleted') for seq, filename in deleted])
+
+    has_more = len(events) > limit
+    events = events[:limit]
+    changes = {'added': [], 'updated': [], 'deleted': []}
+    for event in events:
+        filename = event[1]
+        if len(event) == 3:
+            changes['deleted'].append(filename)
+            continue
+        record = snapshot['records'][filename]
+        kind = 'added' if record.get('created_seq', 0) > since else 'updated'
+        changes[kind].append(record.to_dict())
+
+    # Oldest tombstones are pruned, a client that may have missed one must reload everything
+    changes['reset'] = 0 < since < snapshot['pruned_seq']
+    changes['seq'] = events[-1][0] if has_more else snapshot['seq']
+    changes['has_more'] = has_more
+    return changes
+
+def compute_placeholder(image):
+    """Compute a tiny inline placeholder, dominant colour and dimensions for an image"""
+    try:
+        img = Image.open(image)
+        width, height = img.size
+        img = img.convert('RGB')
+
+        # Average of the whole image as the dominant colour
+        r, g, b = img.resize((1, 1), Image.BOX).getpixel((0, 0))
+
+        # ~16px thumbnail, blurred by the browser when scaled up
+        thumb = img.copy()
+        thumb.thumbnail((16, 16))
+        buffer = io.BytesIO()
+        if features.check('webp'):
+            thumb.save(buffer, 'WEBP', quality=30, method=6)
+            mime = 'image/webp'
+        else:
+            thumb.save(buffer, 'JPEG', quality=30, optimize=True)
+            mime = 'image/jpeg'
+
+        return {
+            'placeholder': f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}",
+            'dominant_color': f"#{r:02x}{g:02x}{b:02x}",
+            'width': width,
+            'height': height,
+        }
+    except Exception as e:
+        print(f"Error computing placeholder: {e}")
+        return {}
+
 def check_nsfw_content(image_path, text):
     """Check if image or text contains NSFW content using basic word filtering"""
     if not text:
@@ -625,15 +1119,15 @@ def index():
     print("Template folder:", os.path.join(os.getcwd(), 'templates'))
     print("Template exists:", os.path.exists(os.path.join(os.getcwd(), 'templates', 'index.html')))
     
-    metadata = load_metadata()
+    metadata = load_records()
     # Get unique categories and models
     categories = set()
     models = set()
     for item in metadata.values():
         if item.get('category'):
-            categories.add(item['category'])
+            categories.add(item.get('category'))
         if item.get('model_name'):
-            models.add(item['model_name'])
+            models.add(item.get('model_name'))
     
     return render_template('index.html', 
                          images=metadata,
@@ -644,8 +1138,8 @@ def index():
 def get_images():
     """Get all images metadata"""
     try:
-        metadata = load_metadata()
-        return jsonify(list(metadata.values()))
+        snapshot = load_gallery_snapshot()
+        return json_records_response(snapshot['records'].values(), snapshot, cache_key='images')
     except Exception as e:
         print(f"Error getting metadata: {e}")
         return jsonify({'error': str(e)}), 500
@@ -660,16 +1154,19 @@ def extract_metadata():
         return jsonify({'error': 'No selected file'}), 400
 
     try:
-        # Save file temporarily
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], 'temp_' + secure_filename(file.filename))
-        file.save(temp_path)
-        
-        # Extract metadata
-        metadata = extract_ai_metadata(temp_path)
-        
-        # Delete temp file
-        os.remove(temp_path)
+        start_staging_gc()
+
+        if not extraction_admission.acquire():
+            return extraction_overloaded()
+        try:
+            # Keep the image staged so /upload can commit it without a second transfer
+            token, staged = stage_upload(file)
+        finally:
+            extraction_admission.release()
         
+        metadata = dict(staged['metadata'])
+        metadata['upload_token'] = token
+        metadata['upload_token_expires_in'] = app.config['STAGING_TTL']
         return jsonify(metadata)
     except Exception as e:
         print(f"Error extracting metadata: {e}")
@@ -677,12 +1174,14 @@ def extract_metadata():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image provided'}), 400
-    
-    file = request.files['image']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    token = request.form.get('upload_token')
+    if not token:
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
 
     # Check required fields
     if not request.form.get('category'):
@@ -691,24 +1190,52 @@ def upload_file():
     if not request.form.getlist('tools'):
         return jsonify({'error': 'At least one tool must be selected'}), 400
 
+    temp_path = None
     try:
-        # Save the image
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(file.filename)}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        if token:
+            # Commit an image staged by /extract_metadata
+            staged = load_staged_upload(token)
+            if not staged:
+                return staged_upload_rejected(token)
+            digest = staged['digest']
+            storage_path = staged['storage_path']
+            original_filename = staged['original_filename']
+            img_metadata = staged['metadata']
+            raw_path = staged.get('raw_path')
+            placeholder = staged['placeholder']
+        else:
+            if not extraction_admission.acquire():
+                return extraction_overloaded()
+            try:
+                # Spool the image locally, extract from the scratch copy, then hand it to blob storage
+                temp_path, digest = spool_upload(file)
+                original_filename = file.filename
+
+                # Extract metadata from image first
+                img_metadata, raw = split_raw_chunks(extract_ai_metadata(temp_path))
+                print("Extracted image metadata:", json.dumps(img_metadata, indent=2))
+
+                storage_path = store_upload(temp_path, digest, original_filename)
+
+                # Raw chunks and workflow graphs live outside the record
+                raw_path = store_raw_chunks(storage_path, raw)
 
-        # Extract metadata from image first
-        img_metadata = extract_ai_metadata(filepath)
-        print("Extracted image metadata:", json.dumps(img_metadata, indent=2))
+                # Placeholder so the grid can paint before the image itself loads
+                placeholder = compute_placeholder(temp_path)
+            finally:
+                extraction_admission.release()
+
+        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(original_filename)}"
 
         # Check for NSFW content
         prompt_text = img_metadata.get('prompt', '') + ' ' + img_metadata.get('negative_prompt', '')
-        is_nsfw = check_nsfw_content(filepath, prompt_text) or request.form.get('is_nsfw') == 'true'
+        is_nsfw = check_nsfw_content(storage_path, prompt_text) or request.form.get('is_nsfw') == 'true'
 
         # Combine image metadata with form data, prioritizing image metadata
         metadata = {
             'filename': filename,
-            'original_filename': file.filename,
+            'storage_path': storage_path,
+            'original_filename': original_filename,
             'upload_date': datetime.now().isoformat(),
             'category': request.form.get('category'),
             'tools': img_metadata.get('tools') or request.form.getlist('tools'),
@@ -720,8 +1247,11 @@ def upload_file():
             'cfg_scale': img_metadata.get('cfg_scale') or request.form.get('cfg_scale', ''),
             'seed': img_metadata.get('seed') or request.form.get('seed', ''),
             'size': img_metadata.get('size') or request.form.get('size', ''),
-            'is_nsfw': is_nsfw
+            'is_nsfw': is_nsfw,
+            'extractor_version': staged.get('extractor_version', 0) if token else EXTRACTOR_VERSION,
         }
+        if request.form.get('is_nsfw') == 'true':
+            metadata['nsfw_manual'] = True
         
         # Add additional metadata fields
         if img_metadata.get('schedule_type'):
@@ -736,11 +1266,41 @@ def upload_file():
             metadata['clip_skip'] = img_metadata.get('clip_skip')
         if img_metadata.get('module_1'):
             metadata['module_1'] = img_metadata.get('module_1')
+        if raw_path:
+            metadata['raw_path'] = raw_path
+        metadata.update(placeholder)
+
+        # Save to metadata file, under the lock so concurrent uploads don't drop each other
+        with metadata_lock():
+            all_metadata = load_metadata()
+            # Two uploads in the same second with the same name would collide
+            if filename in all_metadata:
+                base, ext = os.path.splitext(filename)
+                filename = f"{base}_{digest[:8]}{ext}"
+                counter = 1
+                while filename in all_metadata:
+                    filename = f"{base}_{digest[:8]}_{counter}{ext}"
+                    counter += 1
+                metadata['filename'] = filename
+
+            # The staging GC may have dropped a blob we deduplicated onto before we took the lock
+            if temp_path and not get_storage().head(storage_path):
+                get_storage().put_file(storage_path, temp_path)
+
+            if token:
+                # Claim the token first so a double submit commits only one record
+                staged = claim_staged_upload(token, filename)
+                if not staged:
+                    return staged_upload_rejected(token)
 
-        # Save to metadata file
-        all_metadata = load_metadata()
-        all_metadata[filename] = metadata
-        save_metadata(all_metadata)
+            previous = dict(all_metadata)
+            all_metadata[filename] = metadata
+            try:
+                save_metadata(all_metadata, previous)
+            except Exception:
+                if token:
+                    write_staged_upload(token, staged)
+                raise
 
         return jsonify({
             'success': True,
@@ -754,22 +1314,60 @@ def upload_file():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    storage = get_storage()
+    storage_path = resolve_upload_path(filename)
+    if isinstance(storage, LocalStorage):
+        return send_from_directory(storage.root, storage_path)
+    # Let clients fetch the bytes from the bucket instead of proxying them
+    url = storage.url(storage_path)
+    if url:
+        return redirect(url, code=302)
+    return send_file(storage.open(storage_path), download_name=os.path.basename(storage_path))
+
+@app.route('/images/<filename>/raw')
+def get_raw_chunks(filename):
+    """Raw PNG text chunks (including ComfyUI prompt/workflow JSON) for one image"""
+    try:
+        item = load_records().get(filename)
+        if not item:
+            return jsonify({'error': 'Image not found'}), 404
+
+        raw_path = item.get('raw_path')
+        if not raw_path:
+            # Records that still carry their chunks inline
+            return jsonify({k[len('text_'):]: v for k, v in item.to_dict().items() if k.startswith('text_')})
+
+        with get_storage().open(raw_path) as f:
+            data = f.read()
+        if accepts_encoding(request.headers.get('Accept-Encoding'), 'gzip'):
+            response = Response(data, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(gzip.decompress(data), mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        return response
+    except Exception as e:
+        print(f"Error getting raw chunks: {e}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/models')
 def get_models():
     """Get unique list of model names from uploaded images"""
     try:
-        metadata = load_metadata()
+        metadata = load_records()
         models = set()
         for item in metadata.values():
             if item.get('model_name'):
-                models.add(item['model_name'])
+                models.add(item.get('model_name'))
             elif item.get('model'):  # Fallback to 'model' field
-                models.add(item['model'])
+                models.add(item.get('model'))
         return jsonify(sorted(list(models)))
     except Exception as e:
         print(f"Error getting models: {e}")
@@ -784,7 +1382,8 @@ def search_images():
         model = request.args.get('model', '').lower()
         tool = request.args.get('tool', '').lower()
         
-        metadata = load_metadata()
+        snapshot = load_gallery_snapshot()
+        metadata = snapshot['records']
         results = []
         
         for item in metadata.values():
@@ -820,11 +1419,75 @@ def search_images():
         # Sort by upload date, newest first
         results.sort(key=lambda x: x.get('upload_date', ''), reverse=True)
         
-        return jsonify(results)
+        unfiltered = not query and not tool and category in ('', 'all') and model in ('', 'all')
+        return json_records_response(results, snapshot, cache_key='search' if unfiltered else None)
     except Exception as e:
         print(f"Error searching images: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/changes')
+def get_changes():
+    """Records added, updated and deleted since a change sequence number"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = max(1, min(request.args.get('limit', app.config['CHANGES_PAGE_SIZE'], type=int), app.config['CHANGES_PAGE_SIZE']))
+        return jsonify(collect_changes(since, limit))
+    except Exception as e:
+        print(f"Error getting changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/changes/stream')
+def stream_changes():
+    """
+    Server-Sent Events stream of change deltas. The stream closes after
+    CHANGES_STREAM_TIMEOUT seconds so it doesn't pin a worker thread
+    forever; EventSource reconnects with Last-Event-ID. Only
+    CHANGES_MAX_STREAMS run per worker, further clients get a 503 and
+    poll /changes instead.
+    """
+    if change_stream_slots is None or not change_stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open change streams, poll /changes instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(app.config['CHANGES_RETRY_AFTER'])
+        return response
+
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    poll_interval = app.config['CHANGES_POLL_INTERVAL']
+    deadline = time.monotonic() + app.config['CHANGES_STREAM_TIMEOUT']
+
+    def generate(since):
+        last_sent = time.monotonic()
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            if load_gallery_snapshot()['seq'] > since:
+                changes = collect_changes(since, app.config['CHANGES_PAGE_SIZE'])
+                since = changes['seq']
+                yield f"id: {since}\nevent: changes\ndata: {json.dumps(changes)}\n\n"
+                last_sent = time.monotonic()
+                if changes['has_more']:
+                    continue
+            elif time.monotonic() - last_sent > 15:
+                # Heartbeat so proxies keep the connection open
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(poll_interval)
+
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Called by the server once the stream ends or the client goes away
+    response.call_on_close(change_stream_slots.release)
+    return response
+
+@app.route('/stats/extraction')
+def extraction_stats():
+    """Queue depth and shed counts of the extraction admission control for this worker"""
+    stats = extraction_admission.stats()
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
+
 @app.route('/update_nsfw', methods=['POST'])
 def update_nsfw():
     try:
@@ -837,15 +1500,18 @@ def update_nsfw():
         
         print(f"Updating NSFW status - Image filename: {image_id}, New status: {is_nsfw}")
         
-        metadata = load_metadata()
-        print(f"Current metadata: {metadata}")
-        
-        if image_id in metadata:
-            print(f"Found image {image_id} in metadata")
-            metadata[image_id]['is_nsfw'] = is_nsfw
-            save_metadata(metadata)
-            print(f"Saved metadata for image {image_id}")
-            return jsonify({'success': True, 'is_nsfw': is_nsfw})
+        with metadata_lock():
+            metadata = load_metadata()
+            print(f"Current metadata: {metadata}")
+            
+            if image_id in metadata:
+                print(f"Found image {image_id} in metadata")
+                previous = dict(metadata)
+                # Re-extraction must not override a user's choice
+                metadata[image_id] = dict(metadata[image_id], is_nsfw=is_nsfw, nsfw_manual=True)
+                save_metadata(metadata, previous)
+                print(f"Saved metadata for image {image_id}")
+                return jsonify({'success': True, 'is_nsfw': is_nsfw})
             
         print(f"Image {image_id} not found in metadata")
         return jsonify({'success': False, 'error': 'Image not found'})
@@ -853,16 +1519,397 @@ def update_nsfw():
         print(f"Error in update_nsfw: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
-def save_metadata(metadata):
-    """Save metadata to JSON file"""
+def json_records_response(records, snapshot, cache_key=None):
+    """
+    JSON array response of records. With a cache_key the body is kept in
+    the snapshot, so repeated unfiltered listings are serialized once per
+    metadata change.
+    """
+    body = snapshot['bodies'].get(cache_key) if cache_key else None
+    if body is None:
+        body = join_array([item.to_json() for item in records])
+        if cache_key:
+            snapshot['bodies'][cache_key] = body
+    response = Response(body, mimetype='application/json')
+    response.headers['X-Change-Seq'] = str(snapshot['seq'])
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses with brotli or gzip when the client accepts it"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress_cached(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+_compressed_cache = OrderedDict()
+_compressed_lock = threading.Lock()
+
+def compress_cached(data, encoding):
+    """
+    Compress a body, reusing the result for identical large bodies such as
+    the unfiltered gallery listing, which repeats until a record changes.
+    """
+    if len(data) < 64 * 1024:
+        return compress(data, encoding)
+    key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+    with _compressed_lock:
+        if key in _compressed_cache:
+            _compressed_cache.move_to_end(key)
+            return _compressed_cache[key]
+    compressed = compress(data, encoding)
+    with _compressed_lock:
+        _compressed_cache[key] = compressed
+        while len(_compressed_cache) > 16:
+            _compressed_cache.popitem(last=False)
+    return compressed
+
+def stamp_changes(metadata, previous):
+    """
+    Give every added or modified record the next change sequence number and
+    record tombstones for removed ones, comparing against previous, the
+    records as last saved. Returns the updated change log.
+    Records saved before the change feed existed get their number on the
+    first save, so every record has one the snapshot can match on.
+    """
+    change_log = load_change_log()
+    tombstones = change_log['deleted']
+    seq = max(
+        [item.get('change_seq', 0) for item in previous.values()]
+        + list(tombstones.values()) + [change_log['pruned_seq'], 0]
+    )
+
+    def content(item):
+        return {k: v for k, v in item.items() if k not in ('change_seq', 'created_seq')}
+
+    for filename, item in metadata.items():
+        old = previous.get(filename)
+        if old is not None and 'change_seq' in old and content(old) == content(item):
+            for key in ('change_seq', 'created_seq'):
+                if key in old:
+                    item[key] = old[key]
+            continue
+        seq += 1
+        item['change_seq'] = seq
+        item['created_seq'] = old.get('created_seq', seq) if old is not None else seq
+        tombstones.pop(filename, None)
+
+    for filename in previous:
+        if filename not in metadata:
+            seq += 1
+            tombstones[filename] = seq
+
+    excess = len(tombstones) - app.config['CHANGES_MAX_TOMBSTONES']
+    if excess > 0:
+        by_age = sorted(tombstones.items(), key=lambda x: x[1])
+        change_log['pruned_seq'] = max(change_log['pruned_seq'], by_age[excess - 1][1])
+        tombstones = dict(by_age[excess:])
+    change_log['deleted'] = tombstones
+    return change_log
+
+def write_json_atomic(path, data):
+    """Write a sibling file and swap it in, so readers never see a partial file"""
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dumps(data))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def save_metadata(metadata, previous=None):
+    """
+    Save metadata to JSON file. previous is the metadata as loaded under
+    the same lock, before any record in it was replaced; callers that
+    changed records in place leave it out and the file is read again.
+    """
     try:
         print(f"Saving metadata to file: {app.config['METADATA_FILE']}")
-        with open(app.config['METADATA_FILE'], 'w') as f:
-            json.dump(metadata, f, indent=4)
+        change_log = stamp_changes(metadata, load_metadata() if previous is None else previous)
+        write_json_atomic(app.config['METADATA_FILE'], metadata)
+        write_json_atomic(changes_file_path(), change_log)
         print("Metadata saved successfully")
     except Exception as e:
         print(f"Error saving metadata: {e}")
         raise
 
+def update_records(values, merge):
+    """
+    Merge per-record results of a batch job into metadata.json. Under the
+    metadata lock the file is reloaded, so records changed by the running
+    app meanwhile are kept, and merge(item, value) builds each new record
+    without modifying item.
+    Records deleted in the meantime are skipped. Returns the filenames
+    that were updated.
+    """
+    if not values:
+        return []
+    with metadata_lock():
+        metadata = load_metadata()
+        previous = dict(metadata)
+        updated = [filename for filename in values if filename in metadata]
+        for filename in updated:
+            metadata[filename] = merge(metadata[filename], values[filename])
+        if updated:
+            save_metadata(metadata, previous)
+    return updated
+
+def run_in_batches(filenames, batch_size, process_batch, pause=0.0):
+    """Call process_batch on successive slices of filenames, returning the sum of its counts"""
+    total = 0
+    for start in range(0, len(filenames), batch_size):
+        batch = filenames[start:start + batch_size]
+        print(f"Processing {start + len(batch)}/{len(filenames)}")
+        total += process_batch(batch)
+        if pause and start + batch_size < len(filenames):
+            time.sleep(pause)
+    return total
+
+def read_blob(storage_path):
+    """Read a stored image into memory; storage streams may not be seekable and Pillow needs that"""
+    with get_storage().open(storage_path) as f:
+        return io.BytesIO(f.read())
+
+# Values extraction falls back to when it finds nothing, used to re-extract
+# the worst records first
+EXTRACTION_DEFAULTS = {
+    'prompt': ('No prompt found', 'Error extracting metadata'),
+    'negative_prompt': ('No negative prompt found',),
+    'model_name': ('Unknown model',),
+    'sampler': ('Unknown',),
+}
+
+# Fields re-extraction may refresh; category, tools and other user input are kept
+EXTRACTED_FIELDS = (
+    'prompt', 'negative_prompt', 'model_name', 'steps', 'sampler', 'cfg_scale', 'seed',
+    'size', 'schedule_type', 'distilled_cfg_scale', 'model_hash', 'version', 'clip_skip',
+    'module_1',
+)
+
+def reextract_status_path():
+    """Path of the re-extraction progress file, shared by all worker processes"""
+    return app.config['REEXTRACT_STATUS_FILE'] or f"{os.path.splitext(app.config['METADATA_FILE'])[0]}_reextract.json"
+
+def load_reextract_status():
+    try:
+        with open(reextract_status_path(), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'state': 'idle'}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error loading re-extraction status: {e}")
+        return {'state': 'idle'}
+
+def extraction_default_count(item):
+    """How many summary fields of a record still hold extraction defaults"""
+    return sum(1 for key, defaults in EXTRACTION_DEFAULTS.items() if (item.get(key) or defaults[0]) in defaults)
+
+def pending_reextraction(metadata):
+    """Filenames stamped with an older extractor version, records with the most defaults first"""
+    pending = [
+        (filename, item) for filename, item in metadata.items()
+        if (item.get('extractor_version') or 0) < EXTRACTOR_VERSION
+    ]
+    pending.sort(key=lambda x: (-extraction_default_count(x[1]), x[1].get('extractor_version') or 0, x[0]))
+    return [filename for filename, _ in pending]
+
+def nsfw_set_by_user(item):
+    """
+    Whether a record's is_nsfw is a user's choice. Records saved before
+    nsfw_manual existed count as user-set when they are unflagged although
+    their prompt trips the filter, since upload would have flagged them.
+    """
+    if item.get('nsfw_manual'):
+        return True
+    prompt_text = (item.get('prompt') or '') + ' ' + (item.get('negative_prompt') or '')
+    return not item.get('is_nsfw') and check_nsfw_content(None, prompt_text)
+
+def merge_reextracted(item, img_metadata, raw_path, placeholder):
+    """
+    Apply fresh extraction output, holding only the fields the extractor
+    actually found, to a stored record. is_nsfw only goes up unless the
+    user set it.
+    """
+    updated = dict(item)
+    for key in EXTRACTED_FIELDS:
+        value = img_metadata.get(key)
+        if key == 'model_name':
+            value = value or img_metadata.get('model')
+        if value:
+            updated[key] = value
+
+    if not nsfw_set_by_user(item):
+        prompt_text = (updated.get('prompt') or '') + ' ' + (updated.get('negative_prompt') or '')
+        updated['is_nsfw'] = bool(item.get('is_nsfw')) or check_nsfw_content(None, prompt_text)
+
+    if raw_path:
+        updated['raw_path'] = raw_path
+    for key, value in placeholder.items():
+        updated.setdefault(key, value)
+    updated['extractor_version'] = EXTRACTOR_VERSION
+    return updated
+
+def reextract_one(filename, item):
+    """
+    Re-run extraction for one stored image, returning (img_metadata,
+    raw_path, placeholder). Raises if the image can't be read, so the
+    record is counted as failed and keeps its old version stamp.
+    """
+    storage_path = item.get('storage_path') or filename
+    data = read_blob(storage_path)
+    img_metadata, raw = split_raw_chunks(extract_ai_metadata(data, apply_defaults=False))
+    raw_path = store_raw_chunks(storage_path, raw)
+    placeholder = {}
+    if not item.get('placeholder'):
+        data.seek(0)
+        placeholder = compute_placeholder(data)
+    return img_metadata, raw_path, placeholder
+
+_reextract_lock = threading.Lock()
+
+def reextraction_running_elsewhere(status):
+    """Whether another process reported progress recently enough to still be running"""
+    if status.get('state') != 'running' or status.get('pid') == os.getpid():
+        return False
+    try:
+        last_update = datetime.fromisoformat(status['updated_at'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    # A process that died mid-run stops updating the file
+    return (datetime.now() - last_update).total_seconds() < 600
+
+def reextraction_workers(workers=None, share_slots=True):
+    """Threads a run actually uses; sharing the extraction slots caps it at EXTRACTION_CONCURRENCY"""
+    workers = workers or app.config['REEXTRACT_WORKERS']
+    return min(workers, app.config['EXTRACTION_CONCURRENCY']) if share_slots else workers
+
+def run_reextraction(workers=None, rate=None, batch_size=None, share_slots=True):
+    """
+    Re-extract every record made by an older extractor version, in
+    priority order, with a pool of workers throttled to rate records per
+    second. Results are merged and saved per batch, and progress is
+    written to the status file after each batch. Inside the web app each
+    image takes one of the worker's extraction slots (share_slots); the
+    command line runs in its own process and leaves them alone.
+    """
+    workers = reextraction_workers(workers, share_slots)
+    rate = rate or app.config['REEXTRACT_RATE']
+    batch_size = batch_size or app.config['REEXTRACT_BATCH_SIZE']
+
+    if not _reextract_lock.acquire(blocking=False):
+        return load_reextract_status()
+    try:
+        pending = pending_reextraction(load_metadata())
+        status = {
+            'state': 'running',
+            'extractor_version': EXTRACTOR_VERSION,
+            'total': len(pending),
+            'processed': 0,
+            'updated': 0,
+            'failed': 0,
+            'workers': workers,
+            'pid': os.getpid(),
+            'started_at': datetime.now().isoformat(),
+            'updated_at': datetime.now().isoformat(),
+        }
+        write_json_atomic(reextract_status_path(), status)
+        print(f"Re-extracting {len(pending)} records with extractor version {EXTRACTOR_VERSION}")
+
+        interval = 1.0 / rate if rate > 0 else 0
+        next_start = [time.monotonic()]
+        throttle_lock = threading.Lock()
+
+        def process(filename, item):
+            # Space out starts so the job never exceeds rate records per second
+            with throttle_lock:
+                wait = next_start[0] - time.monotonic()
+                next_start[0] = max(next_start[0], time.monotonic()) + interval
+            if wait > 0:
+                time.sleep(wait)
+            # Share the extraction slots with uploads, which always go first
+            while share_slots and not extraction_admission.try_acquire():
+                time.sleep(0.2)
+            try:
+                return filename, reextract_one(filename, item)
+            except Exception as e:
+                print(f"Error re-extracting {filename}: {e}")
+                return filename, None
+            finally:
+                if share_slots:
+                    extraction_admission.release()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                metadata = load_metadata()
+                jobs = [(filename, metadata[filename]) for filename in batch if filename in metadata]
+                results = list(executor.map(lambda job: process(*job), jobs))
+
+                extracted = {filename: result for filename, result in results if result is not None}
+                updated = update_records(extracted, lambda item, result: merge_reextracted(item, *result))
+                status['processed'] += len(results)
+                status['failed'] += len(results) - len(extracted)
+                status['updated'] += len(updated)
+
+                status['updated_at'] = datetime.now().isoformat()
+                write_json_atomic(reextract_status_path(), status)
+
+        status['state'] = 'done'
+        status['finished_at'] = datetime.now().isoformat()
+        write_json_atomic(reextract_status_path(), status)
+        return status
+    except Exception as e:
+        print(f"Re-extraction failed: {e}")
+        import traceback
+        traceback.print_exc()
+        status = load_reextract_status()
+        status.update({'state': 'failed', 'error': str(e), 'finished_at': datetime.now().isoformat()})
+        write_json_atomic(reextract_status_path(), status)
+        return status
+    finally:
+        _reextract_lock.release()
+
+@app.route('/reextract', methods=['POST'])
+def start_reextraction():
+    """Start re-extracting outdated records in a background thread of this worker"""
+    status = load_reextract_status()
+    if _reextract_lock.locked() or reextraction_running_elsewhere(status):
+        return jsonify({'success': False, 'error': 'Re-extraction already running', 'status': status}), 409
+
+    workers = request.args.get('workers', type=int)
+    rate = request.args.get('rate', type=float)
+    thread = threading.Thread(target=run_reextraction, kwargs={'workers': workers, 'rate': rate}, daemon=True)
+    thread.start()
+    return jsonify({
+        'success': True,
+        'pending': len(pending_reextraction(load_metadata())),
+        'workers': reextraction_workers(workers),
+    }), 202
+
+@app.route('/reextract/status')
+def reextraction_status():
+    """Progress of the current or last re-extraction run"""
+    status = load_reextract_status()
+    status['current_version'] = EXTRACTOR_VERSION
+    status['outdated'] = sum(
+        1 for item in load_records().values() if (item.get('extractor_version') or 0) < EXTRACTOR_VERSION
+    )
+    return jsonify(status)
+
+init_profiling(app)
+
 if __name__ == '__main__':
     app.run(debug=True)
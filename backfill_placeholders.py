@@ -0,0 +1,41 @@
+import argparse
+
+from app import load_metadata, update_records, run_in_batches, read_blob, resolve_upload_path, compute_placeholder
+
+PLACEHOLDER_FIELDS = ('placeholder', 'dominant_color', 'width', 'height')
+
+def pending_filenames(metadata):
+    """Return the filenames whose records have no placeholder yet"""
+    return [
+        filename for filename, item in metadata.items()
+        if not all(item.get(field) for field in PLACEHOLDER_FIELDS)
+    ]
+
+def backfill_batch(filenames):
+    """Compute placeholders for one batch of images and save them to the metadata"""
+    metadata = load_metadata()
+    computed = {}
+    for filename in filenames:
+        try:
+            placeholder = compute_placeholder(read_blob(resolve_upload_path(filename, metadata)))
+            if placeholder:
+                computed[filename] = placeholder
+                print(f"  {filename}: {placeholder['width']}x{placeholder['height']} {placeholder['dominant_color']}")
+        except Exception as e:
+            print(f"  Error processing {filename}: {e}")
+
+    return len(update_records(computed, lambda item, placeholder: dict(item, **placeholder)))
+
+def backfill_placeholders(batch_size=100, pause=0.0):
+    """Compute placeholders for every record that is missing one"""
+    print("Backfilling image placeholders...")
+    total = run_in_batches(pending_filenames(load_metadata()), batch_size, backfill_batch, pause=pause)
+    print(f"Backfill complete: {total} placeholders computed")
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute placeholders for images uploaded before they existed')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of images processed per metadata save')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    args = parser.parse_args()
+    backfill_placeholders(batch_size=args.batch_size, pause=args.pause)
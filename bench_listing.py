@@ -0,0 +1,64 @@
+import json
+import time
+import argparse
+
+import serialization
+from records import ImageRecord
+from bench_records import synthetic_metadata
+
+def timed(func, repeat):
+    """Best wall time of func over repeat runs, in milliseconds, and its result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 2), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark serialization and compression of listing responses')
+    parser.add_argument('--records', type=int, default=10000, help='Number of records in the response')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, best is reported')
+    args = parser.parse_args()
+
+    items = list(json.loads(synthetic_metadata(args.records)).values())
+    records = [ImageRecord.from_dict(item) for item in items]
+
+    report = {
+        'records': args.records,
+        'orjson': serialization.orjson is not None,
+        'brotli': serialization.brotli is not None,
+        'serialize_ms': {},
+        'bytes': {},
+        'compress_ms': {},
+    }
+
+    # What jsonify() did before: stdlib json over freshly built dicts
+    ms, baseline = timed(lambda: json.dumps([record.to_dict() for record in records], sort_keys=True).encode('utf-8'), args.repeat)
+    report['serialize_ms']['stdlib_jsonify'] = ms
+
+    ms, _ = timed(lambda: serialization.dumps([record.to_dict() for record in records]), args.repeat)
+    report['serialize_ms']['fast_encoder_uncached'] = ms
+
+    # First request fills the per-record cache, later ones only join
+    ms, _ = timed(lambda: serialization.join_array([record.to_json() for record in records]), 1)
+    report['serialize_ms']['fragments_cold'] = ms
+    ms, body = timed(lambda: serialization.join_array([record.to_json() for record in records]), args.repeat)
+    report['serialize_ms']['fragments_warm'] = ms
+
+    assert json.loads(body) == json.loads(baseline)
+
+    report['bytes']['stdlib_jsonify'] = len(baseline)
+    report['bytes']['identity'] = len(body)
+    for encoding in ('gzip', 'br'):
+        if encoding == 'br' and serialization.brotli is None:
+            continue
+        ms, compressed = timed(lambda: serialization.compress(body, encoding), args.repeat)
+        report['compress_ms'][encoding] = ms
+        report['bytes'][encoding] = len(compressed)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import gc
+import json
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+from records import ImageRecord
+
+MODELS = ['sdxl_base_1.0', 'dreamshaper_8', 'realisticVision_v51', 'juggernautXL_v9', 'flux1-dev']
+SAMPLERS = ['Euler a', 'DPM++ 2M', 'DPM++ SDE', 'UniPC', 'DDIM']
+SCHEDULES = ['Karras', 'Exponential', 'Automatic']
+CATEGORIES = ['Portrait', 'Landscape', 'Anime', 'Concept Art', 'Abstract']
+TOOLS = ['Stable Diffusion', 'ComfyUI', 'Fooocus']
+SUBJECTS = ['castle', 'portrait', 'forest', 'city', 'dragon', 'robot', 'ocean', 'mountain']
+
+def synthetic_metadata(count, seed=1):
+    """Serialized metadata.json content with count records shaped like real uploads"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    metadata = {}
+    for i in range(count):
+        uploaded = start + timedelta(seconds=i * 37)
+        filename = f"{uploaded.strftime('%Y%m%d_%H%M%S')}_image_{i}.png"
+        model = rng.choice(MODELS)
+        metadata[filename] = {
+            'filename': filename,
+            'storage_path': f"{i:064x}"[:2] + '/' + f"{i:064x}"[2:4] + f"/{i:064x}.png",
+            'original_filename': f"image_{i}.png",
+            'upload_date': uploaded.isoformat(),
+            'category': rng.choice(CATEGORIES),
+            'tools': [rng.choice(TOOLS)],
+            'prompt': f"a {rng.choice(SUBJECTS)} at dusk, highly detailed, {rng.randrange(10 ** 6)}",
+            'negative_prompt': 'blurry, lowres, bad anatomy',
+            'model_name': model,
+            'steps': str(rng.choice([20, 25, 30])),
+            'sampler': rng.choice(SAMPLERS),
+            'schedule_type': rng.choice(SCHEDULES),
+            'cfg_scale': str(rng.choice([5, 6, 7, 7.5])),
+            'seed': str(rng.randrange(2 ** 32)),
+            'size': rng.choice(['512x512', '832x1216', '1024x1024']),
+            'is_nsfw': rng.random() < 0.05,
+            'dominant_color': f"#{rng.randrange(2 ** 24):06x}",
+            'width': 1024,
+            'height': 1024,
+        }
+    return json.dumps(metadata)
+
+def measure(build):
+    """Bytes still allocated by the object build() returns"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of dict records and ImageRecord')
+    parser.add_argument('--records', type=int, default=100000, help='Number of records to load')
+    args = parser.parse_args()
+
+    raw = synthetic_metadata(args.records)
+
+    dict_bytes = measure(lambda: json.loads(raw))
+    record_bytes = measure(lambda: {
+        filename: ImageRecord.from_dict(item)
+        for filename, item in json.loads(raw).items()
+    })
+
+    # Round trip must reproduce the stored JSON shape exactly
+    loaded = json.loads(raw)
+    assert all(ImageRecord.from_dict(item).to_dict() == item for item in loaded.values())
+
+    scale = 100000 / args.records
+    print(json.dumps({
+        'records': args.records,
+        'dict_mb_per_100k': round(dict_bytes * scale / 2 ** 20, 1),
+        'record_mb_per_100k': round(record_bytes * scale / 2 ** 20, 1),
+        'dict_bytes_per_record': dict_bytes // args.records,
+        'record_bytes_per_record': record_bytes // args.records,
+        'reduction': f"{(1 - record_bytes / dict_bytes) * 100:.0f}%",
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from PIL import Image, PngImagePlugin
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODELS = ['sdxl_base_1.0', 'dreamshaper_8', 'realisticVision_v51', 'juggernautXL_v9', 'flux1-dev']
+SAMPLERS = ['Euler a', 'DPM++ 2M', 'DPM++ SDE', 'UniPC', 'DDIM']
+CATEGORIES = ['Portrait', 'Landscape', 'Anime', 'Concept Art', 'Abstract']
+TOOLS = ['Stable Diffusion', 'ComfyUI', 'Fooocus']
+SUBJECTS = ['castle', 'portrait', 'forest', 'city', 'dragon', 'robot', 'ocean', 'mountain']
+STYLES = ['oil painting', 'cinematic lighting', 'watercolor', 'photorealistic', 'anime style']
+
+# Relative weight of each route in the mixed scenario
+DEFAULT_MIX = {
+    'page': 2,
+    'search_all': 10,
+    'search_query': 15,
+    'models': 5,
+    'uploads': 55,
+    'upload': 3,
+    'nsfw_toggle': 2,
+}
+
+def synthetic_png(rng, size=64):
+    """Build a small PNG carrying A1111-style generation parameters"""
+    prompt = f"a {rng.choice(SUBJECTS)}, {rng.choice(STYLES)}, highly detailed"
+    params = {
+        'prompt': prompt,
+        'negative_prompt': 'blurry, lowres',
+        'steps': str(rng.choice([20, 25, 30, 40])),
+        'sampler': rng.choice(SAMPLERS),
+        'cfg_scale': str(rng.choice([5, 6, 7, 7.5])),
+        'seed': str(rng.randrange(2 ** 32)),
+        'size': f"{size}x{size}",
+        'model_name': rng.choice(MODELS),
+    }
+    text = (
+        f"{params['prompt']}\nNegative prompt: {params['negative_prompt']}\n"
+        f"Steps: {params['steps']}, Sampler: {params['sampler']}, CFG scale: {params['cfg_scale']}, "
+        f"Seed: {params['seed']}, Size: {params['size']}, Model: {params['model_name']}"
+    )
+    img = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    info = PngImagePlugin.PngInfo()
+    info.add_text('parameters', text)
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', pnginfo=info)
+    return buffer.getvalue(), params
+
+def seed_gallery(data_dir, count, rng):
+    """Write count synthetic images and their metadata records straight into data_dir"""
+    upload_folder = os.path.join(data_dir, 'uploads')
+    os.makedirs(upload_folder, exist_ok=True)
+    start = datetime(2025, 1, 1)
+    metadata = {}
+    for i in range(count):
+        data, params = synthetic_png(rng)
+        digest = hashlib.sha256(data).hexdigest()
+        storage_path = '/'.join([digest[:2], digest[2:4], f"{digest}.png"])
+        target = os.path.join(upload_folder, *storage_path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+
+        uploaded = start + timedelta(minutes=i)
+        filename = f"{uploaded.strftime('%Y%m%d_%H%M%S')}_seed_{i}.png"
+        record = {
+            'filename': filename,
+            'storage_path': storage_path,
+            'original_filename': f"seed_{i}.png",
+            'upload_date': uploaded.isoformat(),
+            'category': rng.choice(CATEGORIES),
+            'tools': [rng.choice(TOOLS)],
+            'is_nsfw': rng.random() < 0.05,
+        }
+        record.update(params)
+        metadata[filename] = record
+
+    with open(os.path.join(data_dir, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f)
+    return list(metadata)
+
+def remote_filenames(base_url):
+    """Filenames of the images already stored on a running server"""
+    with urllib.request.urlopen(f"{base_url}/images", timeout=60) as response:
+        return [item['filename'] for item in json.loads(response.read()) if item.get('filename')]
+
+def start_server(data_dir, port, workers, threads):
+    """Start the app under gunicorn against data_dir and wait until it answers"""
+    env = dict(os.environ)
+    env.update({
+        'UPLOAD_FOLDER': os.path.join(data_dir, 'uploads'),
+        'METADATA_FILE': os.path.join(data_dir, 'metadata.json'),
+        'STORAGE_BACKEND': 'local',
+        'WORKER_THREADS': str(threads),
+    })
+    log = open(os.path.join(data_dir, 'gunicorn.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app',
+         '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+         '--bind', f"127.0.0.1:{port}", '--log-level', 'warning'],
+        cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited early, see {log.name}")
+        try:
+            urllib.request.urlopen(f"{base_url}/models", timeout=1).read()
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not become ready in 30 seconds")
+
+def multipart_body(fields, files):
+    """Encode form fields and (name, filename, bytes) files as multipart/form-data"""
+    boundary = f"----loadtest{random.getrandbits(64):016x}"
+    parts = []
+    for name, value in fields:
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode()
+        )
+    for name, filename, data in files:
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/png\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b''.join(parts), f"multipart/form-data; boundary={boundary}"
+
+class Scenario:
+    """Builds the next request of the mixed workload"""
+
+    def __init__(self, base_url, filenames, mix, rng):
+        self.base_url = base_url
+        self.filenames = filenames
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.rng = rng
+        self.lock = threading.Lock()
+
+    def next_request(self):
+        """Return (route, url, body, headers, method) for the next request"""
+        with self.lock:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            if route == 'page':
+                return route, '/', None, {}, 'GET'
+            if route == 'search_all':
+                return route, '/search?q=&category=all&model=all', None, {}, 'GET'
+            if route == 'search_query':
+                query = urllib.request.quote(self.rng.choice(SUBJECTS))
+                category = urllib.request.quote(self.rng.choice(CATEGORIES + ['all']))
+                return route, f"/search?q={query}&category={category}&model=all", None, {}, 'GET'
+            if route == 'models':
+                return route, '/models', None, {}, 'GET'
+            if route == 'uploads':
+                filename = urllib.request.quote(self.rng.choice(self.filenames))
+                return route, f"/uploads/{filename}", None, {}, 'GET'
+            if route == 'upload':
+                data, _ = synthetic_png(self.rng)
+                fields = [('category', self.rng.choice(CATEGORIES)), ('tools', self.rng.choice(TOOLS))]
+                body, content_type = multipart_body(fields, [('image', 'loadtest.png', data)])
+                return route, '/upload', body, {'Content-Type': content_type}, 'POST'
+            if route == 'nsfw_toggle':
+                body = json.dumps({
+                    'image_id': self.rng.choice(self.filenames),
+                    'is_nsfw': self.rng.random() < 0.5,
+                }).encode()
+                return route, '/update_nsfw', body, {'Content-Type': 'application/json'}, 'POST'
+            raise ValueError(f"Unknown route {route}")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples, elapsed):
+    """Aggregate (route, latency_ms, status) samples into per-route statistics"""
+    by_route = {}
+    for route, latency, status in samples:
+        by_route.setdefault(route, []).append((latency, status))
+    by_route['all'] = [(latency, status) for _, latency, status in samples]
+
+    report = {}
+    for route, entries in sorted(by_route.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        statuses = {}
+        for _, status in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+        report[route] = {
+            'requests': len(entries),
+            'errors': errors,
+            'status_codes': statuses,
+            'throughput_rps': round(len(entries) / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 2),
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(latencies[-1], 2),
+            },
+        }
+    return report
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects (e.g. presigned S3 URLs) instead of following them"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+def run_load(base_url, scenario, rate, duration, concurrency):
+    """
+    Drive the scenario open-loop at rate requests per second for duration seconds.
+
+    Latency is measured from each request's scheduled start, so time spent
+    waiting for a free client thread counts (no coordinated omission).
+    """
+    opener = urllib.request.build_opener(NoRedirect)
+    samples = []
+    samples_lock = threading.Lock()
+
+    def send(scheduled, route, path, body, headers, method):
+        request = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+        try:
+            with opener.open(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except Exception as e:
+            status = type(e).__name__
+        latency = (time.perf_counter() - scheduled) * 1000
+        with samples_lock:
+            samples.append((route, latency, status))
+
+    total = int(rate * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, scheduled, *scenario.next_request())
+    elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the gallery under gunicorn and report latency percentiles per route')
+    parser.add_argument('--images', type=int, default=1000, help='Number of synthetic images to seed')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--rate', type=float, default=50, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to drive load')
+    parser.add_argument('--concurrency', type=int, default=64, help='Maximum requests in flight')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the local server')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the gallery and request mix')
+    parser.add_argument('--mix', type=json.loads, default=None, help='JSON object of route weights, e.g. \'{"uploads": 80, "search_all": 20}\'')
+    parser.add_argument('--url', help='Drive an already running server instead of starting one, using the images it already has')
+    parser.add_argument('--keep-data', action='store_true', help='Keep the seeded data directory')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {route: weight for route, weight in args.mix.items() if weight > 0}
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            parser.error(f"Unknown routes in --mix: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    data_dir = None
+    process = None
+    try:
+        if args.url:
+            # Requests must name images the target actually has
+            base_url = args.url.rstrip('/')
+            filenames = remote_filenames(base_url)
+            print(f"Using {len(filenames)} images already on {base_url}", file=sys.stderr)
+            if not filenames:
+                for route in ('uploads', 'nsfw_toggle'):
+                    if mix.pop(route, None):
+                        print(f"Target has no images, skipping the {route} route", file=sys.stderr)
+                if not mix:
+                    parser.error('Nothing left to drive, the target has no images')
+        else:
+            data_dir = tempfile.mkdtemp(prefix='gallery_loadtest_')
+            print(f"Seeding {args.images} images into {data_dir}", file=sys.stderr)
+            filenames = seed_gallery(data_dir, args.images, rng)
+            process, base_url = start_server(data_dir, args.port, args.workers, args.threads)
+        print(f"Driving {args.rate} req/s for {args.duration}s against {base_url}", file=sys.stderr)
+
+        scenario = Scenario(base_url, filenames, mix, rng)
+        samples, elapsed = run_load(base_url, scenario, args.rate, args.duration, args.concurrency)
+
+        report = {
+            'config': {
+                'images': len(filenames),
+                'target': args.url or 'local',
+                'workers': args.workers,
+                'threads': args.threads,
+                'target_rate': args.rate,
+                'duration': args.duration,
+                'concurrency': args.concurrency,
+                'seed': args.seed,
+                'mix': mix,
+            },
+            'elapsed_s': round(elapsed, 2),
+            'achieved_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+            'routes': summarize(samples, elapsed),
+        }
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output)
+        else:
+            print(output)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        if data_dir and args.keep_data:
+            print(f"Kept data in {data_dir}", file=sys.stderr)
+        elif data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
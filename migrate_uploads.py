@@ -0,0 +1,81 @@
+import os
+import hashlib
+import argparse
+
+from app import app, get_storage, load_metadata, update_records, run_in_batches, sharded_storage_path
+
+def file_digest(path):
+    """Compute the SHA-256 digest of a file without reading it all into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def pending_filenames(metadata):
+    """Return the filenames that still live in the flat upload folder"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    return [
+        filename for filename, item in metadata.items()
+        if not item.get('storage_path') and os.path.isfile(os.path.join(upload_folder, filename))
+    ]
+
+def migrate_batch(filenames, dry_run=False):
+    """
+    Move one batch of flat uploads into the sharded layout of the
+    configured blob storage (local or S3).
+
+    The sharded copy is created first, then the metadata mapping is saved
+    under the metadata lock, and the flat file is only removed once the
+    saved mapping has been read back, so /uploads/<filename> keeps
+    resolving while the migration runs.
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+    storage = get_storage()
+    moved = {}
+    for filename in filenames:
+        source = os.path.join(upload_folder, filename)
+        try:
+            storage_path = sharded_storage_path(file_digest(source), filename)
+            print(f"  {filename} -> {storage_path}")
+            if dry_run:
+                continue
+            if not storage.head(storage_path):
+                storage.put_file(storage_path, source)
+            moved[filename] = storage_path
+        except Exception as e:
+            print(f"  Error migrating {filename}: {e}")
+
+    update_records(moved, lambda item, storage_path: dict(item, storage_path=storage_path))
+
+    # Re-read what was saved and only drop flat files whose mapping is on disk
+    metadata = load_metadata()
+    migrated = []
+    for filename, storage_path in moved.items():
+        if metadata.get(filename, {}).get('storage_path') != storage_path:
+            print(f"  Keeping {filename}, its storage_path mapping was not saved")
+            continue
+        migrated.append(filename)
+        try:
+            os.remove(os.path.join(upload_folder, filename))
+        except Exception as e:
+            print(f"  Error removing {filename}: {e}")
+    return len(migrated)
+
+def migrate_uploads(batch_size=100, pause=0.0, dry_run=False):
+    """Migrate all flat uploads into the sharded layout in batches"""
+    print("Migrating uploads to sharded layout...")
+    total = run_in_batches(
+        pending_filenames(load_metadata()), batch_size,
+        lambda batch: migrate_batch(batch, dry_run=dry_run), pause=pause,
+    )
+    print(f"Migration complete: {total} files moved")
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move flat uploads into the sharded content-addressed layout')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of files moved per metadata save')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be moved')
+    args = parser.parse_args()
+    migrate_uploads(batch_size=args.batch_size, pause=args.pause, dry_run=args.dry_run)
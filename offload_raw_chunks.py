@@ -0,0 +1,46 @@
+import argparse
+
+from app import load_metadata, update_records, run_in_batches, resolve_upload_path, split_raw_chunks, store_raw_chunks
+
+def pending_filenames(metadata):
+    """Return the filenames whose records still carry raw text_<key> chunks inline"""
+    return [
+        filename for filename, item in metadata.items()
+        if any(key.startswith('text_') for key in item)
+    ]
+
+def with_raw_path(item, raw_path):
+    """The record without its inline chunks, pointing at the offloaded blob"""
+    summary, _ = split_raw_chunks(item)
+    summary['raw_path'] = raw_path
+    return summary
+
+def offload_batch(filenames):
+    """Move the raw chunks of one batch of records into the compressed blob store"""
+    metadata = load_metadata()
+    offloaded = {}
+    for filename in filenames:
+        item = metadata.get(filename)
+        if not item:
+            continue
+        try:
+            _, raw = split_raw_chunks(item)
+            offloaded[filename] = store_raw_chunks(resolve_upload_path(filename, metadata), raw)
+            print(f"  {filename}: {len(raw)} chunks -> {offloaded[filename]}")
+        except Exception as e:
+            print(f"  Error offloading {filename}: {e}")
+
+    return len(update_records(offloaded, with_raw_path))
+
+def offload_raw_chunks(batch_size=100):
+    """Strip inline raw chunks from every stored record"""
+    print("Offloading raw text chunks from metadata records...")
+    total = run_in_batches(pending_filenames(load_metadata()), batch_size, offload_batch)
+    print(f"Offload complete: {total} records slimmed")
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move raw PNG text chunks out of metadata.json into compressed blobs')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of records processed per metadata save')
+    args = parser.parse_args()
+    offload_raw_chunks(batch_size=args.batch_size)
@@ -26,6 +26,10 @@ def prepare_for_github():
                     if os.path.isfile(file_path):
                         os.unlink(file_path)
                         print(f"  Removed: {filename}")
+                    elif os.path.isdir(file_path):
+                        # Shard directories from the content-addressed layout
+                        shutil.rmtree(file_path)
+                        print(f"  Removed: {filename}/")
                 except Exception as e:
                     print(f"  Error removing {filename}: {e}")
     
@@ -44,6 +48,13 @@ def prepare_for_github():
         with open(metadata_file, 'w') as f:
             json.dump({}, f)
     
+    # Change feed tombstones and re-extraction progress refer to the old metadata
+    for state_name in ('metadata_changes.json', 'metadata_reextract.json'):
+        state_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), state_name)
+        if os.path.exists(state_file):
+            print(f"Removing {state_name}")
+            os.unlink(state_file)
+    
     # 3. Check for any __pycache__ directories
     for root, dirs, files in os.walk(os.path.dirname(os.path.abspath(__file__))):
         if '__pycache__' in dirs:
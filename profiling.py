@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from datetime import datetime
+
+from flask import g, request
+
+class StackSampler:
+    """
+    Samples the Python stacks of the threads currently being profiled.
+
+    One daemon thread wakes every interval seconds and, for each
+    registered request thread, counts its stack in collapsed form
+    ("outer;inner;leaf"), the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = {}
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, {})
+
+    def _run(self):
+        while True:
+            # Sleep until a profiled request starts instead of polling
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, counts in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = collapse_stack(frame)
+                    counts[stack] = counts.get(stack, 0) + 1
+
+def collapse_stack(frame):
+    """Render a frame and its callers as 'module:function;...' from the outermost call"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names)).replace(' ', '_')
+
+class RequestProfiler:
+    """
+    Opt-in per-request profiling. Profiles a random sample_rate fraction of
+    requests, plus any request carrying an X-Profile header equal to token,
+    and writes one collapsed-stack .folded file and a .json summary per
+    profiled request into directory, keeping the newest max_files.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, token=None, interval=0.005, max_files=200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_files = max_files
+        self.sampler = StackSampler(interval)
+        self._write_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def should_profile(self):
+        if self.token and request.headers.get('X-Profile') == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def before_request(self):
+        if not self.should_profile():
+            return
+        g.profile_thread = threading.get_ident()
+        g.profile_started = time.perf_counter()
+        self.sampler.start(g.profile_thread)
+
+    def after_request(self, response):
+        if 'profile_thread' in g:
+            g.profile_status = response.status_code
+        return response
+
+    def teardown_request(self, exc):
+        if 'profile_thread' not in g:
+            return
+        counts = self.sampler.stop(g.profile_thread)
+        # Finished before the first sample, nothing to draw
+        if not counts:
+            return
+        duration_ms = (time.perf_counter() - g.profile_started) * 1000
+        route = request.url_rule.rule if request.url_rule else request.path
+        try:
+            self.write_profile(counts, {
+                'method': request.method,
+                'route': route,
+                'path': request.full_path.rstrip('?'),
+                'status': g.get('profile_status', 500),
+                'duration_ms': round(duration_ms, 2),
+                'samples': sum(counts.values()),
+                'interval_ms': self.sampler.interval * 1000,
+                'timestamp': datetime.now().isoformat(),
+                'pid': os.getpid(),
+            })
+        except Exception as e:
+            print(f"Error writing request profile: {e}")
+
+    def write_profile(self, counts, summary):
+        route_slug = ''.join(c if c.isalnum() else '_' for c in summary['route']).strip('_') or 'root'
+        name = (f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{summary['method']}_{route_slug}"
+                f"_{int(summary['duration_ms'])}ms_{summary['pid']}")
+        base = os.path.join(self.directory, name)
+        with open(f"{base}.folded", 'w') as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+        with open(f"{base}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+        self.rotate()
+
+    def rotate(self):
+        """Delete the oldest profiles beyond max_files"""
+        with self._write_lock:
+            profiles = sorted(name for name in os.listdir(self.directory) if name.endswith('.folded'))
+            for name in profiles[:max(0, len(profiles) - self.max_files)]:
+                base = os.path.join(self.directory, name[:-len('.folded')])
+                for ext in ('.folded', '.json'):
+                    try:
+                        os.remove(base + ext)
+                    except FileNotFoundError:
+                        pass
+
+def init_profiling(app):
+    """
+    Install request profiling when PROFILE_SAMPLE_RATE or PROFILE_TOKEN is
+    set. Nothing is registered otherwise, so disabled profiling adds no
+    per-request work.
+    """
+    sample_rate = app.config.get('PROFILE_SAMPLE_RATE') or 0.0
+    token = app.config.get('PROFILE_TOKEN')
+    if sample_rate <= 0 and not token:
+        return None
+
+    profiler = RequestProfiler(
+        app.config['PROFILE_DIR'],
+        sample_rate=sample_rate,
+        token=token,
+        interval=app.config.get('PROFILE_INTERVAL', 0.005),
+        max_files=app.config.get('PROFILE_MAX_FILES', 200),
+    )
+    app.before_request(profiler.before_request)
+    app.after_request(profiler.after_request)
+    app.teardown_request(profiler.teardown_request)
+    print(f"Request profiling enabled: sample rate {sample_rate}, token {'set' if token else 'not set'}, writing to {profiler.directory}")
+    return profiler
@@ -0,0 +1,120 @@
+import sys
+
+from serialization import dumps
+
+_MISSING = object()
+
+# Fields whose values repeat across thousands of images, interned so every
+# record shares one string object per distinct value
+INTERNED_FIELDS = (
+    'category', 'model_name', 'model', 'model_hash', 'sampler', 'schedule_type',
+    'size', 'version',
+)
+
+# Numeric fields the extractor stores as strings ('20', '7.5'), kept as
+# numbers in memory and turned back into the same strings at the API edge
+NUMERIC_STRING_FIELDS = ('steps', 'seed', 'cfg_scale', 'distilled_cfg_scale', 'clip_skip')
+
+# Numeric fields already stored as JSON numbers
+INT_FIELDS = ('width', 'height', 'change_seq', 'created_seq', 'extractor_version')
+
+FIELDS = (
+    'filename', 'storage_path', 'raw_path', 'original_filename', 'upload_date', 'category', 'tools',
+    'prompt', 'negative_prompt', 'model_name', 'model', 'model_hash', 'steps', 'sampler',
+    'schedule_type', 'cfg_scale', 'distilled_cfg_scale', 'seed', 'size', 'clip_skip',
+    'version', 'is_nsfw', 'placeholder', 'dominant_color', 'width', 'height',
+    'change_seq', 'created_seq', 'extractor_version', 'nsfw_manual',
+)
+
+_tools_cache = {}
+
+def _intern_tools(tools):
+    """Share one tuple per distinct tools list"""
+    key = tuple(sys.intern(t) if isinstance(t, str) else t for t in tools)
+    return _tools_cache.setdefault(key, key)
+
+def _parse_number(value):
+    """Parse a numeric string, returning _MISSING unless it prints back identically"""
+    try:
+        number = int(value)
+    except ValueError:
+        try:
+            number = float(value)
+        except ValueError:
+            return _MISSING
+    return number if str(number) == value else _MISSING
+
+class ImageRecord:
+    """
+    Compact in-memory form of one image's metadata.
+
+    Known fields live in slots, low-cardinality strings are interned and
+    numeric strings are stored as numbers. Anything that doesn't fit a
+    slot (raw text chunks, module_* keys, unexpected types) is kept as is
+    in extra. to_dict() gives back the same JSON shape that was loaded.
+    """
+
+    __slots__ = FIELDS + ('extra',)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls()
+        extra = {}
+        for key, value in data.items():
+            if key not in FIELDS:
+                extra[key] = value
+            elif key in INTERNED_FIELDS and isinstance(value, str):
+                setattr(record, key, sys.intern(value))
+            elif key in NUMERIC_STRING_FIELDS:
+                number = _parse_number(value) if isinstance(value, str) else _MISSING
+                if number is _MISSING:
+                    extra[key] = value
+                else:
+                    setattr(record, key, number)
+            elif key in INT_FIELDS and type(value) is not int:
+                extra[key] = value
+            elif key == 'tools' and isinstance(value, list):
+                setattr(record, key, _intern_tools(value))
+            elif key == 'tools':
+                extra[key] = value
+            else:
+                setattr(record, key, value)
+        record.extra = extra or None
+        return record
+
+    def get(self, key, default=None):
+        """dict.get() equivalent returning values in their JSON shape"""
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key not in FIELDS:
+            return default
+        value = getattr(self, key, _MISSING)
+        if value is _MISSING:
+            return default
+        if key in NUMERIC_STRING_FIELDS:
+            return str(value)
+        if key == 'tools':
+            return list(value)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def to_dict(self):
+        data = {}
+        for key in FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                continue
+            if key in NUMERIC_STRING_FIELDS:
+                value = str(value)
+            elif key == 'tools':
+                value = list(value)
+            data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        """Serialized JSON bytes of to_dict()"""
+        return dumps(self.to_dict())
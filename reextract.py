@@ -0,0 +1,15 @@
+import sys
+import argparse
+
+from app import app, run_reextraction
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-run metadata extraction for records made by an older extractor version')
+    parser.add_argument('--workers', type=int, default=app.config['REEXTRACT_WORKERS'], help='Images extracted in parallel')
+    parser.add_argument('--rate', type=float, default=app.config['REEXTRACT_RATE'], help='Maximum images per second')
+    parser.add_argument('--batch-size', type=int, default=app.config['REEXTRACT_BATCH_SIZE'], help='Images processed per metadata save')
+    args = parser.parse_args()
+    # This process serves no uploads, so there are no extraction slots to share
+    status = run_reextraction(workers=args.workers, rate=args.rate, batch_size=args.batch_size, share_slots=False)
+    print(f"Re-extraction {status.get('state')}: {status.get('updated', 0)} updated, {status.get('failed', 0)} failed of {status.get('total', 0)}")
+    sys.exit(0 if status.get('state') == 'done' else 1)
@@ -0,0 +1,67 @@
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+def dumps(obj):
+    """Serialize to compact UTF-8 JSON bytes with sorted keys, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def loads(data):
+    """Parse JSON text or bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def join_array(fragments):
+    """Build a JSON array from already serialized element fragments"""
+    return b'[' + b','.join(fragments) + b']'
+
+def parse_accept_encoding(accept_encoding):
+    """Parse an Accept-Encoding header into {coding: quality}"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+def accepts_encoding(accept_encoding, encoding):
+    """Whether the client accepts encoding with a non-zero quality, directly or through *"""
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get(encoding, accepted.get('*', 0)) > 0
+
+def choose_encoding(accept_encoding):
+    """Pick the best content encoding the client accepts: br, then gzip, else None"""
+    if brotli is not None and accepts_encoding(accept_encoding, 'br'):
+        return 'br'
+    if accepts_encoding(accept_encoding, 'gzip'):
+        return 'gzip'
+    return None
+
+def compress(data, encoding):
+    """Compress a response body with a speed-oriented level"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=5)
+    return data
@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import urllib.request
+
+from PIL import Image
+
+BUCKET = 'gallery-smoke-test'
+MULTIPART_THRESHOLD = 5 * 1024 * 1024  # Smallest part size S3 accepts
+
+def check(name, condition, detail=''):
+    """Print one check result and remember failures"""
+    print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail and not condition else ''}")
+    if not condition:
+        check.failed += 1
+
+check.failed = 0
+
+def run_checks(app_module):
+    """Exercise S3Storage directly and through the app's upload and serve routes"""
+    storage = app_module.get_storage()
+    storage.client.create_bucket(Bucket=BUCKET)
+
+    storage.put('smoke/small.txt', io.BytesIO(b'hello'), content_type='text/plain')
+    with storage.open('smoke/small.txt') as f:
+        check('put + open round trip', f.read() == b'hello')
+    check('head of an existing key', storage.head('smoke/small.txt') == {'size': 5, 'content_type': 'text/plain'})
+    check('head of a missing key', storage.head('smoke/missing.txt') is None)
+
+    large = os.urandom(MULTIPART_THRESHOLD * 2 + 1024)
+    fd, large_path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(large)
+        storage.put_file('smoke/large.bin', large_path)
+    finally:
+        os.remove(large_path)
+    etag = storage.client.head_object(Bucket=BUCKET, Key='smoke/large.bin')['ETag']
+    # Multipart ETags end in -<part count>
+    check('put_file above the threshold uses multipart', etag.strip('"').endswith('-3'), etag)
+    with storage.open('smoke/large.bin') as f:
+        check('multipart object reads back intact', f.read() == large)
+
+    check('list_keys', sorted(storage.list_keys('smoke/')) == ['smoke/large.bin', 'smoke/small.txt'])
+    storage.delete('smoke/small.txt')
+    check('delete removes the key', storage.head('smoke/small.txt') is None)
+    try:
+        storage.delete('smoke/small.txt')
+        check('delete of a missing key is ignored', True)
+    except Exception as e:
+        check('delete of a missing key is ignored', False, e)
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 40, 40)).save(buffer, 'PNG')
+    image = buffer.getvalue()
+    client = app_module.app.test_client()
+    response = client.post('/upload', data={
+        'image': (io.BytesIO(image), 'smoke.png'),
+        'category': 'Smoke',
+        'tools': 'Stable Diffusion',
+    })
+    check('/upload stores the image in the bucket', response.status_code == 200, response.get_data(as_text=True)[:200])
+    if response.status_code != 200:
+        return
+
+    filename = response.get_json()['filename']
+    response = client.get(f"/uploads/{filename}")
+    location = response.headers.get('Location', '')
+    check('/uploads/<filename> redirects', response.status_code == 302, response.status_code)
+    check('redirect is a presigned bucket URL', BUCKET in location and 'Signature' in location, location)
+    with urllib.request.urlopen(location, timeout=10) as presigned:
+        check('presigned URL serves the uploaded bytes', presigned.read() == image)
+
+def main():
+    parser = argparse.ArgumentParser(description='Smoke-test the S3 storage backend against a local S3 stand-in')
+    parser.add_argument('--endpoint-url', help='Use an already running S3-compatible server (e.g. MinIO) instead of moto')
+    parser.add_argument('--port', type=int, default=5599, help='Port for the moto server')
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if not endpoint_url:
+        try:
+            from moto.server import ThreadedMotoServer
+        except ImportError:
+            sys.exit("smoke_s3.py needs moto to start a local S3 (pip install 'moto[server]'), or pass --endpoint-url")
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=args.port, verbose=False)
+        server.start()
+        endpoint_url = f"http://127.0.0.1:{args.port}"
+
+    data_dir = tempfile.mkdtemp(prefix='gallery_s3_smoke_')
+    os.environ.update({
+        'STORAGE_BACKEND': 's3',
+        'S3_BUCKET': BUCKET,
+        'S3_ENDPOINT_URL': endpoint_url,
+        'S3_REGION': os.environ.get('S3_REGION', 'us-east-1'),
+        'S3_MULTIPART_THRESHOLD': str(MULTIPART_THRESHOLD),
+        'UPLOAD_FOLDER': os.path.join(data_dir, 'uploads'),
+        'METADATA_FILE': os.path.join(data_dir, 'metadata.json'),
+    })
+    if server:
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'smoke')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'smoke')
+
+    try:
+        import app
+        run_checks(app)
+    finally:
+        if server:
+            server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{check.failed} checks failed" if check.failed else "All checks passed")
+    sys.exit(1 if check.failed else 0)
+
+if __name__ == '__main__':
+    main()
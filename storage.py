@@ -0,0 +1,193 @@
+import os
+import stat
+import shutil
+import mimetypes
+
+class BlobStorage:
+    """Interface for where uploaded image bytes live"""
+
+    def put(self, key, stream, content_type=None):
+        """Store the contents of a readable binary stream under key"""
+        raise NotImplementedError
+
+    def put_file(self, key, path, content_type=None):
+        """Store a local file under key, leaving the local file in place"""
+        with open(path, 'rb') as f:
+            self.put(key, f, content_type=content_type)
+
+    def open(self, key):
+        """Return a readable binary stream for key"""
+        raise NotImplementedError
+
+    def url(self, key):
+        """Return a URL clients can be redirected to, or None to stream through the app"""
+        return None
+
+    def head(self, key):
+        """Return {'size', 'content_type'} for key, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key, ignoring keys that don't exist"""
+        raise NotImplementedError
+
+    def list_keys(self, prefix):
+        """Yield every key under prefix"""
+        raise NotImplementedError
+
+class LocalStorage(BlobStorage):
+    """Blob storage on the local filesystem, rooted at the upload folder"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key, stream, content_type=None):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.part"
+        with open(temp_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, 64 * 1024)
+        os.replace(temp_path, target)
+
+    def put_file(self, key, path, content_type=None):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            # Hard link when on the same filesystem, avoids copying the bytes
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(path, target)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def head(self, key):
+        target = self.path(key)
+        try:
+            st = os.stat(target)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return {
+            'size': st.st_size,
+            'content_type': mimetypes.guess_type(target)[0] or 'application/octet-stream',
+        }
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, prefix):
+        for dirpath, _, names in os.walk(self.path(prefix)):
+            for name in names:
+                # Skip writes still in progress
+                if name.endswith('.part'):
+                    continue
+                yield os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, '/')
+
+class S3Storage(BlobStorage):
+    """
+    Blob storage in an S3-compatible bucket.
+
+    A single client is shared per process so connections are pooled, large
+    files go through multipart upload, and reads are served as presigned
+    redirects. smoke_s3.py exercises it against a local moto server.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 max_pool_connections=20, multipart_threshold=8 * 1024 * 1024,
+                 url_expires=3600):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.url_expires = url_expires
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=max_pool_connections,
+                          retries={'max_attempts': 3, 'mode': 'standard'}),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_threshold,
+            max_concurrency=4,
+        )
+
+    def object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, key, stream, content_type=None):
+        content_type = content_type or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        self.client.upload_fileobj(
+            stream, self.bucket, self.object_key(key),
+            ExtraArgs={'ContentType': content_type},
+            Config=self.transfer_config,
+        )
+
+    def open(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        return response['Body']
+
+    def url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.object_key(key)},
+            ExpiresIn=self.url_expires,
+        )
+
+    def head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {
+            'size': response['ContentLength'],
+            'content_type': response.get('ContentType', 'application/octet-stream'),
+        }
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def list_keys(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(self.prefix) + 1:] if self.prefix else obj['Key']
+
+def create_storage(config):
+    """Build the blob storage backend selected by STORAGE_BACKEND"""
+    backend = (config.get('STORAGE_BACKEND') or 'local').lower()
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 's3':
+        if not config.get('S3_BUCKET'):
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        return S3Storage(
+            config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX', ''),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            max_pool_connections=int(config.get('S3_MAX_POOL_CONNECTIONS', 20)),
+            multipart_threshold=int(config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024)),
+            url_expires=int(config.get('S3_URL_EXPIRES', 3600)),
+        )
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend}")